@@ -0,0 +1,74 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-4.0
+
+import tracemalloc
+import argparse
+import timeit
+import copy
+import sys
+import os
+
+import penman
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import engine_AMR
+
+# This micro-benchmark compares building the chopped graph halves with copy.deepcopy (as chopGraph used to) against building them directly from the new triples.
+
+# A newswire-style record with several named entities, as these are the records where chopping is most expensive.
+RECORD = """# ::id bench.1
+# ::snt Officials from France, Italy and Spain met John Smith in New York on 31 December 2004
+(m / meet-03
+   :ARG0 (o / official
+            :source (a / and
+                       :op1 (c / country :name (n / name :op1 "France"))
+                       :op2 (c2 / country :name (n2 / name :op1 "Italy"))
+                       :op3 (c3 / country :name (n3 / name :op1 "Spain"))))
+   :ARG1 (p / person :name (n4 / name :op1 "John" :op2 "Smith"))
+   :location (c4 / city :name (n5 / name :op1 "New" :op2 "York"))
+   :time (d / date-entity :day 31 :month 12 :year 2004))"""
+
+# The previous implementation of chopGraph, kept here as the baseline.
+def deepcopyChopGraph(graph, newTriples, utt, h2, node):
+    gh = copy.deepcopy(graph)
+    gh.triples = newTriples
+    gh.metadata = {}
+    gh.metadata["id"] = graph.metadata["id"]
+    gh.metadata["chop-date"] = "2022-06-29"
+    gh.metadata["chop-section"] = "incomplete"
+    gh.metadata["snt"] = utt
+    gh.metadata["tok"] = utt
+    gh.epidata = {}
+    if h2:
+        gh.top = node
+        gh.metadata["chop-section"] = "completion"
+    return gh
+
+# Chop the record at every name and date node, building both halves with the given chopGraph implementation.
+def chopAll(chopGraph, graph, nodes):
+    index = engine_AMR.GraphIndex(graph.triples)
+    for node in nodes:
+        half1, half2 = engine_AMR.chopTriples(index, node, graph.top)
+        chopGraph(graph, half1, "utt", False, None)
+        chopGraph(graph, half2, "label", True, node)
+
+# Measure the peak memory allocated while chopping the record once.
+def peakAllocated(chopGraph, graph, nodes):
+    tracemalloc.start()
+    chopAll(chopGraph, graph, nodes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000, help="number of times the record is chopped when timing (default: 2000)")
+    args = parser.parse_args()
+
+    graph = penman.decode(RECORD)
+    nodes, _ = engine_AMR.getNameInfo(engine_AMR.GraphIndex(graph.triples))
+    print("Chopping a record with %d triples at %d nodes" % (len(graph.triples), len(nodes)))
+    for name, chopGraph in (("deepcopy", deepcopyChopGraph), ("direct", engine_AMR.chopGraph)):
+        seconds = timeit.timeit(lambda: chopAll(chopGraph, graph, nodes), number=args.repeat)
+        peak = peakAllocated(chopGraph, graph, nodes)
+        print("%-10s %8.1f us/record %8d bytes peak allocated" % (name, seconds / args.repeat * 1e6, peak))
@@ -0,0 +1,196 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-4.0
+
+import multiprocessing
+import tracemalloc
+import tempfile
+import argparse
+import json
+import time
+import sys
+import os
+
+import penman
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import engine_AMR
+import synthetic_AMR
+
+# This benchmark suite measures the throughput (records per second) and peak memory of each stage of chopping, and of the whole pipeline, on a synthetic corpus (see synthetic_AMR.py).
+# Every stage is run in its own fresh process, so that one stage can not affect another. The inputs a stage needs (e.g. decoded graphs for getNameInfo) are prepared before it is measured.
+# The peak memory of a stage is the most memory it allocates on top of its prepared inputs, traced by tracemalloc during a separate, untimed run (as tracing slows the stage down).
+# The results can be saved as a baseline, and later runs checked against it, so that performance regressions fail the check.
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# The strategy benchmarked for each mode: chop_AMR.py chops at the end of the utterance and disrput_AMR.py disrupts it anywhere.
+MODES = {"chop": "end", "disrupt": "anywhere"}
+
+STAGES = ["parseOriginal", "getNameInfo", "willItChop", "chopAMR", "store", "end-to-end"]
+
+# Prepare the inputs of the given stage from the synthetic records, by running every stage before it.
+def prepare(stage, strategy, records):
+    if stage in ("parseOriginal", "end-to-end"):
+        return records
+    parsed = [engine_AMR.parseOriginal(record) for record in records]
+    if stage == "getNameInfo":
+        return parsed
+    indexed = []
+    for utterance, graph in parsed:
+        index = engine_AMR.GraphIndex(graph.triples)
+        indexed.append((utterance, index) + engine_AMR.getNameInfo(index))
+    if stage == "willItChop":
+        return indexed
+    chops = []
+    for (utterance, index, nodes, labels), (_, graph) in zip(indexed, parsed):
+        tokens = engine_AMR.tokenize(utterance)
+        matches = engine_AMR.matchLabels(tokens, nodes, labels)
+        for node, label, span in strategy.willItChop(tokens, nodes, labels, matches):
+            choppedUtt = strategy.chopUtterance(utterance, tokens, span)
+            if choppedUtt.replace(" UNK", "") != "":
+                chops.append((choppedUtt, graph, index, node, label))
+    if stage == "chopAMR":
+        return chops
+    encoded = []
+    for chop in chops:
+        halves = engine_AMR.chopAMR(*chop)
+        try:
+            if halves is not None:
+                encoded.append([penman.encode(graph) for graph in (chop[1],) + halves])
+        except penman.exceptions.LayoutError:
+            pass
+    return encoded
+
+# Run the given stage once over all of its prepared inputs.
+def runOnce(stage, strategy, inputs, outdir):
+    if stage == "parseOriginal":
+        for record in inputs:
+            engine_AMR.parseOriginal(record)
+    # getNameInfo needs the graph index, so building it is part of this stage (as in processRecord).
+    elif stage == "getNameInfo":
+        for utterance, graph in inputs:
+            engine_AMR.getNameInfo(engine_AMR.GraphIndex(graph.triples))
+    elif stage == "willItChop":
+        for utterance, index, nodes, labels in inputs:
+            tokens = engine_AMR.tokenize(utterance)
+            strategy.willItChop(tokens, nodes, labels, engine_AMR.matchLabels(tokens, nodes, labels))
+    elif stage == "chopAMR":
+        for chop in inputs:
+            engine_AMR.chopAMR(*chop)
+    elif stage == "store":
+        with engine_AMR.CorpusWriter(os.path.join(outdir, "bench.txt"), strategy.suffix) as writer:
+            for encoded in inputs:
+                writer.store(*encoded)
+    elif stage == "end-to-end":
+        with engine_AMR.CorpusWriter(os.path.join(outdir, "bench.txt"), strategy.suffix) as writer:
+            for record in inputs:
+                chops, stats = engine_AMR.processRecord(record, [strategy.name])
+                for chop in chops[strategy.name]:
+                    writer.store(*chop[:3])
+
+# Time running the stage the given number of times in a row.
+def timeLoops(stage, strategy, inputs, outdir, loops):
+    start = time.perf_counter()
+    for _ in range(loops):
+        runOnce(stage, strategy, inputs, outdir)
+    return time.perf_counter() - start
+
+# Benchmark one stage of one mode. This is run in a fresh process for every stage.
+# Fast stages are run several times in a row (as timeit.autorange does) so that each timing takes at least minSeconds.
+# Returns the best time per run of the given number of repeats, and the peak memory allocated by one run.
+def benchmarkStage(mode, stage, corpusOptions, repeat, minSeconds=0.2):
+    strategy = engine_AMR.STRATEGIES[MODES[mode]]
+    records = list(synthetic_AMR.generateCorpus(**corpusOptions))
+    inputs = prepare(stage, strategy, records)
+    with tempfile.TemporaryDirectory() as outdir:
+        loops = 1
+        while timeLoops(stage, strategy, inputs, outdir, loops) < minSeconds:
+            loops *= 10
+        best = min(timeLoops(stage, strategy, inputs, outdir, loops) for _ in range(repeat)) / loops
+        tracemalloc.start()
+        runOnce(stage, strategy, inputs, outdir)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "seconds": round(best, 6),
+        "loops": loops,
+        "recordsPerSecond": round(len(records) / best, 1),
+        "peakAllocatedMB": round(peak / 1048576, 3),
+    }
+
+# Run every stage of every mode, each in its own process.
+def runBenchmarks(corpusOptions, repeat=3, modes=tuple(MODES), stages=tuple(STAGES)):
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for mode in modes:
+        for stage in stages:
+            with context.Pool(1) as pool:
+                results[mode + "/" + stage] = pool.apply(benchmarkStage, (mode, stage, corpusOptions, repeat))
+            print("%-24s %10.1f records/s %9.3f MB peak allocated" % (mode + "/" + stage, results[mode + "/" + stage]["recordsPerSecond"], results[mode + "/" + stage]["peakAllocatedMB"]))
+    return results
+
+# Compare the results with the baseline, and return a description of every regression beyond the given tolerance (a fraction, e.g. 0.4 for 40%).
+# Throughput regresses if it falls below the baseline, and memory if it rises above it by more than the tolerance plus memorySlack (in MB).
+# Most stages only allocate a few KB, which varies from run to run by more than the tolerance, so small differences in memory are never regressions.
+def checkBaseline(results, baseline, tolerance, memorySlack=0.0625):
+    regressions = []
+    for name, expected in baseline["results"].items():
+        if name not in results:
+            continue
+        measured = results[name]
+        if measured["recordsPerSecond"] < expected["recordsPerSecond"] * (1 - tolerance):
+            regressions.append("%s: %.1f records/s, baseline %.1f" % (name, measured["recordsPerSecond"], expected["recordsPerSecond"]))
+        if measured["peakAllocatedMB"] > expected["peakAllocatedMB"] * (1 + tolerance) + memorySlack:
+            regressions.append("%s: %.3f MB peak allocated, baseline %.3f" % (name, measured["peakAllocatedMB"], expected["peakAllocatedMB"]))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1000, help="number of synthetic records (default: 1000)")
+    parser.add_argument("--sentence-length", type=int, default=20, help="approximate number of tokens per sentence (default: 20)")
+    parser.add_argument("--entity-density", type=float, default=0.2, help="probability that an argument is a named entity (default: 0.2)")
+    parser.add_argument("--date-density", type=float, default=0.05, help="probability that an argument is a date entity (default: 0.05)")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth of nested predicates (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the synthetic corpus (default: 0)")
+    parser.add_argument("--repeat", type=int, default=5, help="number of times each stage is timed, keeping the best (default: 5)")
+    parser.add_argument("--mode", choices=sorted(MODES), action="append", help="only benchmark the given mode (may be repeated)")
+    parser.add_argument("--stage", choices=STAGES, action="append", help="only benchmark the given stage (may be repeated)")
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline results (default: benchmarks/baseline.json)")
+    parser.add_argument("--update-baseline", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="fail if any result regressed from the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.4, help="allowed regression from the baseline, as a fraction (default: 0.4)")
+    parser.add_argument("--memory-slack", type=int, default=64, help="allowed rise in peak memory on top of the tolerance, in KB (default: 64)")
+    args = parser.parse_args()
+
+    corpusOptions = {
+        "records": args.records,
+        "sentenceLength": args.sentence_length,
+        "entityDensity": args.entity_density,
+        "dateDensity": args.date_density,
+        "depth": args.depth,
+        "seed": args.seed,
+    }
+    results = runBenchmarks(corpusOptions, args.repeat, args.mode or tuple(MODES), args.stage or STAGES)
+    report = {"corpus": corpusOptions, "penman": penman.__version__, "python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print("Baseline written to " + args.baseline)
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Results are only comparable on the same synthetic corpus.
+        if baseline["corpus"] != corpusOptions:
+            sys.exit("The baseline was measured on a different synthetic corpus: " + json.dumps(baseline["corpus"]))
+        regressions = checkBaseline(results, baseline, args.tolerance, args.memory_slack / 1024)
+        if regressions:
+            print("Performance regressions beyond %d%% of the baseline:" % (args.tolerance * 100))
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print("No regressions beyond %d%% of the baseline." % (args.tolerance * 100))
@@ -0,0 +1,98 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-4.0
+
+import argparse
+import random
+import sys
+
+import penman
+
+# This code generates a synthetic AMR corpus for benchmarking, as the real AMR 3.0 corpus is licensed and can't be used in CI.
+# The graphs are not meaningful AMR, but have the same shape as the records we chop: predicates with nested arguments, named entities and date entities, and a sentence containing their labels.
+
+VERBS = ["meet", "open", "like", "say", "visit", "sign", "report", "announce", "leave", "build"]
+NOUNS = ["official", "troop", "company", "road", "minister", "bank", "team", "city", "deal", "plan"]
+ROLES = [":ARG0", ":ARG1", ":ARG2", ":location", ":mod", ":topic"]
+ENTITIES = ["country", "person", "city", "organization"]
+FILLER = ["the", "a", "of", "in", "and", "on", "with", "that", "for", "to"]
+
+# Make up a capitalised name token, e.g. "Kalomi".
+def makeName(rng):
+    return "".join(rng.choice("bcdfgklmnprstvz") + rng.choice("aeiou") for _ in range(rng.randint(2, 4))).capitalize()
+
+# Build a synthetic graph for one sentence. Every concept adds a word to the sentence, and every name or date adds its label, in the order the graph is built.
+# Returns the triples and the sentence tokens.
+def buildGraph(rng, sentenceLength, entityDensity, dateDensity, depth):
+    triples = []
+    tokens = []
+    variables = {"count": 0}
+
+    def newVariable(concept):
+        variables["count"] += 1
+        variable = concept[0] + str(variables["count"])
+        triples.append((variable, ":instance", concept))
+        return variable
+
+    def addNode(level):
+        roll = rng.random()
+        # A named entity, e.g. (c / country :name (n / name :op1 "Kalomi")).
+        if roll < entityDensity:
+            entity = newVariable(rng.choice(ENTITIES))
+            name = newVariable("name")
+            triples.append((entity, ":name", name))
+            for i in range(rng.randint(1, 2)):
+                part = makeName(rng)
+                triples.append((name, ":op" + str(i + 1), '"' + part + '"'))
+                tokens.append(part)
+            return entity
+        # A date entity, e.g. (d / date-entity :day 31 :month 12 :year 2004).
+        if roll < entityDensity + dateDensity:
+            date = newVariable("date-entity")
+            for role, value in ((":day", rng.randint(1, 28)), (":month", rng.randint(1, 12)), (":year", rng.randint(1950, 2022))):
+                triples.append((date, role, str(value)))
+                tokens.append(str(value))
+            return date
+        # A predicate with nested arguments, while there is depth and sentence length left for them.
+        if level < depth and len(tokens) < sentenceLength:
+            verb = rng.choice(VERBS)
+            predicate = newVariable(verb + "-01")
+            tokens.append(verb)
+            for role in rng.sample(ROLES, rng.randint(1, 3)):
+                if len(tokens) >= sentenceLength:
+                    break
+                triples.append((predicate, role, addNode(level + 1)))
+            return predicate
+        noun = rng.choice(NOUNS)
+        tokens.append(noun)
+        return newVariable(noun)
+
+    top = newVariable(rng.choice(VERBS) + "-01")
+    tokens.append(triples[0][2][:-3])
+    while len(tokens) < sentenceLength:
+        triples.append((top, rng.choice(ROLES), addNode(1)))
+        # Pad the sentence with filler words between arguments.
+        tokens.append(rng.choice(FILLER))
+    return top, triples, tokens
+
+# Generate the given number of synthetic AMR records as penman strings, reproducibly for the same seed.
+def generateCorpus(records, sentenceLength=20, entityDensity=0.2, dateDensity=0.05, depth=3, seed=0):
+    rng = random.Random(seed)
+    for i in range(records):
+        top, triples, tokens = buildGraph(rng, sentenceLength, entityDensity, dateDensity, depth)
+        # Half the time, end the sentence with the last entity's label, as those are the sentences that can be chopped at the end.
+        if tokens[-1] in FILLER and rng.random() < 0.5:
+            tokens.pop()
+        graph = penman.Graph(triples, top=top, metadata={"id": "synthetic.%d" % i, "snt": " ".join(tokens) + "."})
+        yield penman.encode(graph)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=1000, help="number of records to generate (default: 1000)")
+    parser.add_argument("--sentence-length", type=int, default=20, help="approximate number of tokens per sentence (default: 20)")
+    parser.add_argument("--entity-density", type=float, default=0.2, help="probability that an argument is a named entity (default: 0.2)")
+    parser.add_argument("--date-density", type=float, default=0.05, help="probability that an argument is a date entity (default: 0.05)")
+    parser.add_argument("--depth", type=int, default=3, help="maximum depth of nested predicates (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args()
+    for record in generateCorpus(args.records, args.sentence_length, args.entity_density, args.date_density, args.depth, args.seed):
+        sys.stdout.write(record + "\n\n")
@@ -0,0 +1,1459 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-4.0
+
+from tqdm import tqdm
+import penman
+import multiprocessing
+import collections
+import contextlib
+import functools
+import hashlib
+import gzip
+import glob
+import io
+import pickle
+import mmap
+import random
+import shutil
+import cProfile
+import json
+import time
+import argparse
+import re
+import os
+
+# This code is the shared engine used to interrupt and disrupt AMR. By that we mean, chopping named entities from an utterance.
+# Each record is decoded once, and every requested strategy is applied to it in the same pass:
+# 1) "end" chops named entities from the END of an utterance, e.g. "She likes France and"
+# 2) "end-unk" does the same, but adds the UNK tag where the entity was, e.g. "She likes France and UNK"
+# 3) "anywhere" chops named entities from anywhere in an utterance, replacing them with the UNK tag, e.g. "She likes UNK and Italy"
+# Note that with "anywhere", if more than one chop is possible, all are completed - but only one per example.
+# To illustrate, the sentence "I ate a pear and an orange" would result in two chopped outputs:
+# 1) "I ate a UNK and an orange"
+# 2) "I ate a pear and an UNK"
+
+# Given an original AMR record, decode it into a penman graph and return it with some additional metadata (for use in the final corpus).
+# Records from the decoded-graph cache have already been decoded, so their graph only needs rebuilding.
+def parseOriginal(AMRrecord):
+    if isinstance(AMRrecord, str):
+        graph = penman.decode(AMRrecord)
+    else:
+        graph = penman.Graph(*AMRrecord[1])
+    graph.metadata["chop-section"] = "original"
+    # Return the cleaned utterance and pased AMR graph.
+    return graph.metadata["snt"].replace(".","").replace("?","").strip(), graph
+
+# An index of the graph triples, built once per record so that finding the triples around a node is a dictionary lookup rather than a scan of the whole graph.
+# outgoing maps each source node to the positions of the triples it starts, incoming maps each target to the positions of the triples it ends, and concepts maps each concept to the variables that are instances of it.
+class GraphIndex:
+    def __init__(self, triples):
+        self.triples = triples
+        self.outgoing = {}
+        self.incoming = {}
+        self.concepts = {}
+        # The position of each variable's instance triple, used to keep nodes in graph order.
+        self.order = {}
+        for i, triple in enumerate(triples):
+            self.outgoing.setdefault(triple[0], []).append(i)
+            self.incoming.setdefault(triple[2], []).append(i)
+            if triple[1] == ":instance":
+                self.concepts.setdefault(triple[2], []).append(triple[0])
+                self.order.setdefault(triple[0], i)
+
+# These are the date node types that we are interested in from the AMR spec.
+TIME_PREDS = [":day", ":month", ":year", ":year2"]
+
+# The concepts whose nodes are labelled by their name or date parts.
+LABELLED_CONCEPTS = ["name", "date-entity"]
+
+# Check every triple that starts with the given node. If it is a name or date part, add it to the node's string label.
+# Returns the label, or an empty string if the node has no name or date parts.
+def nodeLabel(index, node):
+    parts = []
+    for i in index.outgoing.get(node, []):
+        triple = index.triples[i]
+        if triple[1].startswith(":op") or triple[1] in TIME_PREDS:
+            parts.append(triple[2].replace('"',''))
+    return " ".join(parts)
+
+# This function searches the AMR graph for all named entity and date nodes.
+def getNameInfo(index):
+    labels = {}
+    # Look up every name and date node, keeping them in the order they appear in the graph.
+    nodes = [node for concept in LABELLED_CONCEPTS for node in index.concepts.get(concept, [])]
+    nodes.sort(key=index.order.get)
+
+    # Extract the string label of every node we just found above.
+    for node in nodes:
+        label = nodeLabel(index, node)
+        if label:
+            labels[node] = label
+
+    # Return the list of suitable chop point nodes, and their respective labels.
+    return nodes, labels
+
+# Split the utterance into tokens once, keeping the character offsets of each token so it can be disrupted in place.
+def tokenize(utt):
+    return [(match.group(), match.start(), match.end()) for match in re.finditer(r"\S+", utt)]
+
+# Build a token trie of the node labels, so that every label can be matched against the utterance in a single pass.
+# Each entry maps a token to a pair of (the entries for the next token, the nodes whose label ends with this token).
+def buildLabelTrie(nodes, labels):
+    trie = {}
+    for node in nodes:
+        # Nodes without a label (e.g. a name with no :op) can never be matched.
+        words = labels.get(node, "").split()
+        if not words:
+            continue
+        level = trie
+        for word in words[:-1]:
+            level = level.setdefault(word, ({}, []))[0]
+        level.setdefault(words[-1], ({}, []))[1].append(node)
+    return trie
+
+# Find every occurrence of every node label in the utterance tokens.
+# Returns a dictionary from each matched node to the list of (start, end) token spans where its label occurs, in utterance order.
+def matchLabels(tokens, nodes, labels):
+    trie = buildLabelTrie(nodes, labels)
+    matches = {}
+    for start in range(len(tokens)):
+        level = trie
+        for end in range(start, len(tokens)):
+            entry = level.get(tokens[end][0])
+            if entry is None:
+                break
+            for node in entry[1]:
+                matches.setdefault(node, []).append((start, end + 1))
+            level = entry[0]
+    return matches
+
+# This function checks whether the AMR graph can be chopped at the end of the utterance, and returns the chop node, label and token span if so.
+# At most one chop is returned, as only one entity can end the utterance.
+def willItChopEnd(tokens, nodes, labels, matches, allMentions=False):
+    for node in nodes:
+        # Check whether the utterance ends with the node's label. If it does, then return that this graph is truly choppable, and return the node and label at which chopping is possible.
+        span = (len(tokens) - len(labels.get(node, "").split()), len(tokens))
+        if span in matches.get(node, []):
+            return [(node, labels[node], span)]
+        # This checks whether the node is a date and checks whether the utterance ends with a token that starts with this date.
+        # For clarity, the date node with label 31 would be identified as choppable here if the utterance ends with "31st".
+        elif node.startswith("d") and node in labels and tokens and tokens[-1][0].startswith(labels[node]):
+            return [(node, tokens[-1][0], (len(tokens) - 1, len(tokens)))]
+    # If all nodes are checked and haven't returned, chopping is not possible.
+    return []
+
+# This function finds every point at which the AMR graph can be disrupted, and returns the chop node, label and token span of each.
+# Only the first mention of each label is disrupted, unless allMentions is True, in which case each mention is disrupted separately.
+def willItChopAnywhere(tokens, nodes, labels, matches, allMentions=False):
+    chops = []
+    # Check whether the utterance contains each node's label, and if it does, return the node, label and position at which chopping is possible.
+    for node in nodes:
+        spans = matches.get(node, [])
+        if not allMentions:
+            spans = spans[:1]
+        for span in spans:
+            chops.append((node, labels[node], span))
+    return chops
+
+# With --alignments, chop points come from the token alignments of each record (e.g. the output of the IBM aligner) rather than from string matching.
+# This finds labels whatever their surface form (e.g. "31st" or "Port-Vila"), and supports every aligned entity, not only name and date-entity nodes.
+# JAMR-style ::alignments metadata maps token spans to node addresses, e.g. "3-5|0.1.0+0.1.0.0+0.1.0.1", where 0 is the top node and 0.1.0 the first child of its second child.
+ALIGNMENT_PATTERN = re.compile(r"(\d+)-(\d+)\|(\S+)")
+
+# The concepts that can be chopped when using alignments: names, and any entity or quantity (e.g. date-entity, url-entity or monetary-quantity).
+def isEntityConcept(concept):
+    return concept == "name" or concept.endswith("-entity") or concept.endswith("-quantity")
+
+# Map the JAMR address of every node and constant in the graph to its variable. Constants (e.g. the :op1 "France" of a name) belong to the node they hang from.
+# Re-entrant references to a variable (e.g. the p of :ARG0 p) are not children in JAMR addresses, so they are not numbered.
+def nodeAddresses(graph):
+    addresses = {}
+    variables = graph.variables()
+    def walk(node, address):
+        variable, branches = node
+        addresses[address] = variable
+        children = [target for role, target in branches if role != "/" and not (isinstance(target, str) and target in variables)]
+        for i, target in enumerate(children):
+            if isinstance(target, tuple):
+                walk(target, address + "." + str(i))
+            else:
+                addresses[address + "." + str(i)] = variable
+    walk(penman.configure(graph).node, "0")
+    return addresses
+
+# Read the token alignments of a record, from its ::alignments metadata, or failing that from surface alignments in the graph (e.g. "France"~e.3).
+# Returns a dictionary from each token position to the set of variables aligned to it, or None if the record is not aligned.
+def readAlignments(graph):
+    alignments = {}
+    if "alignments" in graph.metadata:
+        addresses = nodeAddresses(graph)
+        for start, end, nodes in ALIGNMENT_PATTERN.findall(graph.metadata["alignments"]):
+            for address in nodes.split("+"):
+                if address in addresses:
+                    for position in range(int(start), int(end)):
+                        alignments.setdefault(position, set()).add(addresses[address])
+    else:
+        for triple, alignment in penman.surface.alignments(graph).items():
+            for position in alignment.indices:
+                alignments.setdefault(position, set()).add(triple[0])
+    return alignments or None
+
+# Alignments index the tokens of the ::tok metadata (or the sentence, if there is none). Clean each token as parseOriginal cleans the sentence, dropping any that are left empty (e.g. "."), and keep where each token moved to.
+# Returns the cleaned utterance and a dictionary from each aligned token position to its position in the utterance.
+def alignedUtterance(graph):
+    words = []
+    positions = {}
+    for i, token in enumerate(graph.metadata.get("tok", graph.metadata.get("snt", "")).split()):
+        token = token.replace(".","").replace("?","")
+        if token:
+            positions[i] = len(words)
+            words.append(token)
+    return " ".join(words), positions
+
+# The aligned counterpart of getNameInfo and matchLabels: find every aligned entity node, in graph order, with the utterance span it is aligned to.
+# The label of each node is the aligned text itself, and a node aligned to separate parts of the utterance keeps its first span.
+# Returns the nodes, labels and matches in the same form as getNameInfo and matchLabels, so every strategy can use them unchanged.
+def alignedNameInfo(index, alignments, positions, tokens):
+    aligned = {}
+    for position, variables in alignments.items():
+        if position in positions:
+            for variable in variables:
+                aligned.setdefault(variable, set()).add(positions[position])
+    nodes = []
+    labels = {}
+    matches = {}
+    for variable in sorted(index.order, key=index.order.get):
+        if variable not in aligned or not isEntityConcept(index.triples[index.order[variable]][2]):
+            continue
+        start = end = min(aligned[variable])
+        while end in aligned[variable]:
+            end += 1
+        nodes.append(variable)
+        labels[variable] = " ".join(token[0] for token in tokens[start:end])
+        matches[variable] = [(start, end)]
+    return nodes, labels, matches
+
+# The utterance is split by chopping the label's tokens off the end (span identified in the willItChop function).
+def truncateUtterance(utt, tokens, span):
+    return ' '.join(token[0] for token in tokens[:span[0]]).strip()
+
+# The same as truncateUtterance, but with the UNK tag added where the label was.
+def truncateUnkUtterance(utt, tokens, span):
+    return truncateUtterance(utt, tokens, span) + " UNK"
+
+# The utterance is disrupted by replacing the label's tokens with the UNK token (span identified in the willItChop function).
+# Replacing whole tokens by position means "US" is never replaced inside a word, e.g. "Julius is useless" stays intact, and repeated mentions can each be disrupted.
+def unkUtterance(utt, tokens, span):
+    start, end = span
+    return (utt[:tokens[start][1]] + "UNK" + utt[tokens[end - 1][2]:]).strip()
+
+# A disruption strategy: how to find the chop points in an utterance, how to chop the utterance at one of them, and the suffix added to its output files.
+class Strategy:
+    def __init__(self, name, suffix, willItChop, chopUtterance, description):
+        self.name = name
+        self.suffix = suffix
+        self.willItChop = willItChop
+        self.chopUtterance = chopUtterance
+        self.description = description
+
+# The available strategies, by name. Each can be selected on the command line with --<name>.
+STRATEGIES = {
+    "end": Strategy("end", "", willItChopEnd, truncateUtterance, "chop named entities from the end of the utterance"),
+    "end-unk": Strategy("end-unk", "-unk", willItChopEnd, truncateUnkUtterance, "chop named entities from the end of the utterance, leaving an UNK tag"),
+    "anywhere": Strategy("anywhere", "-disrupted", willItChopAnywhere, unkUtterance, "replace named entities anywhere in the utterance with an UNK tag"),
+}
+
+# The variables joined to the given variable by an edge, in either direction (as inverted roles, e.g. :ARG0-of, point up the tree), with whether the edge is outgoing.
+# Only variables with an instance triple are neighbours, so constants are never mistaken for nodes, and instance triples are not edges (a concept can share its name with a variable, e.g. (i / i)).
+def neighbours(index, variable):
+    for i in index.outgoing.get(variable, []) + index.incoming.get(variable, []):
+        source, role, target = index.triples[i]
+        if role == ":instance":
+            continue
+        other = target if source == variable else source
+        if other in index.order:
+            yield other, source == variable
+
+# Find every variable connected to the start variable without passing through the blocked variable.
+def connectedVariables(index, start, blocked=None):
+    seen = {start}
+    queue = collections.deque([start])
+    while queue:
+        for other, _ in neighbours(index, queue.popleft()):
+            if other not in seen and other != blocked:
+                seen.add(other)
+                queue.append(other)
+    return seen
+
+# Given the graph index, the node at which to chop it and the graph top, split the triples into the two new halves.
+# The first half (incomplete utterance) keeps everything still connected to the top once the chop node is removed, with the node replaced by the underspecification (UNK).
+# The second half (the sentence completion) is the whole subgraph that hangs from the chop node, however deep, e.g. nested :op chains or the children of a date.
+# Nodes that the completion shares with the first half (re-entrancies) are copied into the completion as leaves, with their concept and constants but not their edges.
+# As both halves are built by searching out from their top, they are always connected and rooted, so the only chops that cannot make two valid graphs are those at the top itself (or at a constant), for which None is returned without any further work.
+# The utterance is only chopped at the chop node's label, so if the label is given, chops whose completion holds another name or date with words outside the label are rejected too.
+# For example, chopping "2004" from (d / date-entity :year 2004 :mod (w / weekday :name (n / name :op1 "Monday"))) would move Monday into the completion, while leaving it in the incomplete utterance.
+def chopTriples(index, node, top, label=None):
+    if node == top or node not in index.order or top not in index.order:
+        return None
+    # Most chop nodes (e.g. names) are leaves with a single parent. Removing a leaf cannot disconnect the rest of the graph, so there is no need to search it.
+    parents = index.incoming.get(node, [])
+    if len(parents) == 1 and index.triples[parents[0]][1] != ":instance" and not any(outgoing for _, outgoing in neighbours(index, node)):
+        # The first half starts as every triple, in the original order, with the triple that ends with the chop node ending with UNK instead.
+        half1 = list(index.triples)
+        i = parents[0]
+        half1[i] = (half1[i][0], half1[i][1], 'UNK')
+        # The triples that start with the chop node are moved to the second half.
+        half2 = [index.triples[i] for i in index.outgoing[node]]
+        for i in reversed(index.outgoing[node]):
+            del half1[i]
+        return half1, half2
+    kept = connectedVariables(index, top, node)
+    # Find the completion's nodes by a breadth-first search from the chop node. Shared nodes can only be reached by the chop node's outgoing edges, and are not searched any further.
+    chopped = {node}
+    shared = set()
+    queue = collections.deque([node])
+    while queue:
+        for other, outgoing in neighbours(index, queue.popleft()):
+            if other in chopped or other in shared:
+                continue
+            if other not in kept:
+                chopped.add(other)
+                queue.append(other)
+            elif outgoing:
+                shared.add(other)
+    if label is not None:
+        words = set(label.split())
+        for other in (chopped | shared) - {node}:
+            if index.triples[index.order[other]][2] in LABELLED_CONCEPTS and not set(nodeLabel(index, other).split()) <= words:
+                return None
+    half1 = []
+    half2 = []
+    # Both halves keep the triples in their original order.
+    for triple in index.triples:
+        source, role, target = triple
+        isEdge = role != ":instance" and target in index.order
+        if source in kept:
+            # If the triple ends with the node we wish to chop, replace the node with the underspecification (UNK).
+            half1.append((source, role, 'UNK') if isEdge and target == node else triple)
+        if source in chopped and (not isEdge or target in chopped or target in shared):
+            half2.append(triple)
+        elif source in shared and not isEdge:
+            half2.append(triple)
+    # Return both halves.
+    return half1, half2
+
+# Given the original graph, split triples, chopped utterance, and new top node if h2 is True.
+# Set h2 True if it's the second half (aka the completion or chopped named entity) of the chopped utterance, and False if the first half.
+# The graph top must be changed to the given node if h2 is True, otherwise we would be left with a disconnected AMR graph.
+def chopGraph(graph, newTriples, utt, h2, node):
+    # Keep the metadata we need and add extra metadata about chopping.
+    metadata = {}
+    metadata["id"] = graph.metadata["id"]
+    metadata["chop-date"] = "2022-06-29" # TODO update if planning to release new version.
+    metadata["chop-section"] = "incomplete"
+    metadata["snt"] = utt
+    metadata["tok"] = utt
+    top = graph.top
+
+    # If the chopped graph is the completion section, set the 'top' to the new graph root and set the correct chop-section in the metadata.
+    if h2:
+        top = node
+        metadata["chop-section"] = "completion"
+    # Build the graph half directly from the new chopped triples rather than copying the original graph, as everything else would be replaced anyway.
+    # The graph epidata is left empty as it is no longer valid for the chopped graph.
+    return penman.Graph(newTriples, top=top, metadata=metadata)
+
+# This function receives the original data and the chopped utterance, and returns the chopped AMR graph halves, or None if either half would not be a valid graph (or would not match the chopped utterance).
+def chopAMR(choppedUtt, graph, index, node, label):
+    # The triples are split on the given node identified in the willItChop function.
+    halves = chopTriples(index, node, graph.top, label)
+    if halves is None:
+        return None
+    triplesHalf1, triplesHalf2 = halves
+    # Using the split triples and chopped utterance, we can generate the chopped graph halves.
+    gh1 = chopGraph(graph, triplesHalf1, choppedUtt, False, None)
+    gh2 = chopGraph(graph, triplesHalf2, label, True, node)
+    return gh1, gh2
+
+# When testing, 'store can be replaced by 'display' in the processRecord function.
+def display(original, gh1, gh2):
+    try:
+        print("_____________________ORIGINAL_____________________")
+        print(penman.encode(original))
+        print("__________________Chopped Half 1__________________")
+        print(penman.encode(gh1))
+        print("__________________Chopped Half 2__________________")
+        print(penman.encode(gh2))
+    except penman.exceptions.LayoutError:
+        print("FAILED")
+        return
+
+# Statistics about a run: how many records were seen, skipped, chopped and rejected, the ids of rejected records, and how long each stage took.
+# Each record's stats are collected where it is processed (possibly in a worker process) and merged into the run's stats in the main process.
+class RunStats:
+    # The stages of processing a record, in order, which are timed separately.
+    stages = ["prefilter", "decode", "entities", "match", "chop", "encode", "write"]
+
+    def __init__(self):
+        self.counts = collections.Counter()
+        self.seconds = collections.Counter()
+        self.layoutFailures = []
+        self.invalidChops = []
+        self.prefilterMisses = []
+
+    # Time the code run inside the with statement, adding it to the given stage.
+    @contextlib.contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+
+    # Add another set of stats (e.g. from a single record) to these.
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.seconds.update(other.seconds)
+        self.layoutFailures.extend(other.layoutFailures)
+        self.invalidChops.extend(other.invalidChops)
+        self.prefilterMisses.extend(other.prefilterMisses)
+
+    # Return the stats as a dictionary which can be written as JSON.
+    def report(self):
+        return {
+            "counts": dict(sorted(self.counts.items())),
+            "seconds": {stage: round(self.seconds[stage], 6) for stage in self.stages + sorted(set(self.seconds) - set(self.stages))},
+            "layoutFailures": self.layoutFailures,
+            "invalidChops": self.invalidChops,
+            "prefilterMisses": self.prefilterMisses,
+        }
+
+# On the odd occasion (rare), our chopped graphs are not valid AMR. Chops that cannot make two rooted graphs, or whose completion holds more than the chopped label, are rejected by chopAMR before any encoding, and penman.encode checks the rest before storing.
+# Returns the encoded original and graph halves, or None if any of them is invalid, in which case the record id is added to the stats.
+# Strategies often chop a record at the same node, so the encoded graphs are kept in the record's cache and reused.
+def encodeChop(original, choppedUtt, index, node, label, cache, stats):
+    try:
+        incompleteKey = ("incomplete", node, choppedUtt)
+        completionKey = ("completion", node, label)
+        if incompleteKey not in cache or completionKey not in cache:
+            with stats.timer("chop"):
+                halves = chopAMR(choppedUtt, original, index, node, label)
+            if halves is None:
+                stats.counts["invalidChops"] += 1
+                stats.invalidChops.append(original.metadata.get("id"))
+                return None
+            gh1, gh2 = halves
+            with stats.timer("encode"):
+                if "original" not in cache:
+                    cache["original"] = penman.encode(original)
+                if incompleteKey not in cache:
+                    cache[incompleteKey] = penman.encode(gh1)
+                if completionKey not in cache:
+                    cache[completionKey] = penman.encode(gh2)
+        return cache["original"], cache[incompleteKey], cache[completionKey]
+    except penman.exceptions.LayoutError:
+        # If the AMR graph is invalid, we do not store it, but note which record failed.
+        stats.counts["layoutFailures"] += 1
+        stats.layoutFailures.append(original.metadata.get("id"))
+        return None
+
+# The output path of an input AMR file: the same path, but under ./output/ rather than ./input/.
+def outputPath(filepath):
+    return filepath.replace("./input/", "./output/")
+
+# The path of a file derived from an output path, with the suffix added before its extension (e.g. "dev.txt" becomes "dev-all.txt"), and optionally a new extension.
+# Only the extension is split off, so inputs with any extension (or none) never share a path with their outputs.
+def derivedPath(outpath, suffix, extension=None):
+    root, ext = os.path.splitext(outpath)
+    return root + suffix + (ext if extension is None else extension)
+
+# Stores the chopped corpora. Every output file is opened once per run and writes are buffered in memory until flushSize bytes are waiting.
+# The outputs are written to temporary files which are only renamed into place when the run succeeds, so rerunning replaces the outputs rather than appending duplicates.
+class CorpusWriter:
+    # For later experimentation with different pipelines, we store variations of the chopped data.
+    # Each variation lists which of the original (0), incomplete (1) and completion (2) graphs it contains:
+    # - The 'all' dataset contains the original full AMR graphs, the incomplete underspecified graphs, and the completions.
+    # - The 'orignal' dataset contains only the original full AMR graphs. We evaluate the full AMR sota model on this subset to check that it is not a particularly easy/difficult subset.
+    # - The 'chopped' dataset contains only the incomplete underspecified graphs, and the completions.
+    # - The 'incomplete' dataset contains only the incomplete underspecified graphs.
+    # - The 'completion' dataset contains only the AMR/completion pairs.
+    variants = {
+        "all": (0, 1, 2),
+        "original": (0,),
+        "chopped": (1, 2),
+        "incomplete": (1,),
+        "completion": (2,),
+    }
+
+    # The output path of each variant. The suffix is added before each variant name, so that every strategy has its own outputs.
+    @classmethod
+    def variantPaths(cls, outpath, suffix=""):
+        return {variant: derivedPath(outpath, suffix + "-" + variant) for variant in cls.variants}
+
+    # If resumeSizes is given, the existing temporary files are appended to, after truncating them to the given sizes (e.g. those of the last checkpoint).
+    def __init__(self, outpath, suffix="", flushSize=1048576, resumeSizes=None):
+        self.flushSize = flushSize
+        self.paths = self.variantPaths(outpath, suffix)
+        self.files = {}
+        self.buffers = {}
+        self.buffered = 0
+        # The size of each output, including anything still buffered, so the manifest knows where each record's chops start.
+        self.sizes = {}
+        try:
+            for variant, path in self.paths.items():
+                if resumeSizes is None:
+                    self.files[variant] = open(path + ".tmp", "wb")
+                    self.sizes[variant] = 0
+                else:
+                    self.files[variant] = open(path + ".tmp", "r+b")
+                    self.files[variant].truncate(resumeSizes[variant])
+                    self.files[variant].seek(resumeSizes[variant])
+                    self.sizes[variant] = resumeSizes[variant]
+                self.buffers[variant] = []
+        except OSError:
+            self.abort()
+            raise
+
+    # Buffer the encoded original graph and graph halves in every variant.
+    def store(self, pmoriginal, pmgh1, pmgh2):
+        graphs = [(graph + "\n\n").encode("utf-8") for graph in (pmoriginal, pmgh1, pmgh2)]
+        for variant, parts in self.variants.items():
+            for part in parts:
+                self.buffers[variant].append(graphs[part])
+                self.sizes[variant] += len(graphs[part])
+                self.buffered += len(graphs[part])
+        if self.buffered >= self.flushSize:
+            self.flush()
+
+    # Write everything buffered so far to the temporary files.
+    def flush(self):
+        for variant, buffer in self.buffers.items():
+            self.files[variant].write(b"".join(buffer))
+            buffer.clear()
+        self.buffered = 0
+
+    # Flush everything buffered so far all the way to disk, and return the size of each output.
+    def checkpoint(self):
+        self.flush()
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        return dict(self.sizes)
+
+    # Flush and close the temporary files.
+    def finish(self):
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+    # Atomically move the finished temporary files to their final paths.
+    def commit(self):
+        for path in self.paths.values():
+            os.replace(path + ".tmp", path)
+
+    # Flush and close the temporary files, then atomically move them to their final paths.
+    def close(self):
+        self.finish()
+        self.commit()
+
+    # Close the temporary files without touching any previous outputs. The temporary files are kept, so that an interrupted run can be resumed from its last checkpoint.
+    def abort(self):
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.abort()
+
+# pyarrow is only needed for the Parquet export, so it is only imported when that is used.
+def importPyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("the Parquet export needs the pyarrow package (pip install pyarrow)")
+    return pyarrow
+
+# Exports every chop as one structured row, so that downstream consumers can pair each incomplete graph with its completion without decoding the penman outputs.
+# Each row has the record id, strategy, chop node, label, token span (in the cleaned utterance) and the encoded original, incomplete and completion graphs.
+# Rows are written batchSize at a time, as JSON lines or as a Parquet table, to a temporary file which is only renamed into place when the export is closed.
+class ChopExporter:
+    columns = ["id", "strategy", "node", "label", "tokenStart", "tokenEnd", "original", "incomplete", "completion"]
+    extensions = {"jsonl": ".jsonl", "parquet": ".parquet"}
+
+    # The path of the export of the given output path and strategies.
+    @classmethod
+    def exportPath(cls, outpath, strategies, exportFormat):
+        return derivedPath(outpath, "-" + "-".join(strategies) + "-chops", cls.extensions[exportFormat])
+
+    def __init__(self, path, exportFormat="jsonl", batchSize=1024):
+        self.path = path
+        self.exportFormat = exportFormat
+        self.batchSize = batchSize
+        self.rows = []
+        if exportFormat == "parquet":
+            pyarrow = importPyarrow()
+            self.schema = pyarrow.schema([(column, pyarrow.int32() if column.startswith("token") else pyarrow.string()) for column in self.columns])
+            self.file = pyarrow.parquet.ParquetWriter(path + ".tmp", self.schema)
+        else:
+            self.file = open(path + ".tmp", "w", encoding="utf-8")
+
+    # Add the row of a chop from processRecord.
+    def add(self, chop):
+        row = dict(chop[3])
+        row["original"], row["incomplete"], row["completion"] = chop[:3]
+        self.rows.append(row)
+        if len(self.rows) >= self.batchSize:
+            self.flush()
+
+    # Write the rows added so far as one batch.
+    def flush(self):
+        if not self.rows:
+            return
+        if self.exportFormat == "parquet":
+            self.file.write_table(importPyarrow().Table.from_pylist(self.rows, schema=self.schema))
+        else:
+            self.file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in self.rows))
+        self.rows = []
+
+    # Write any remaining rows, and move the export into place.
+    def close(self):
+        self.flush()
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+    # Close and remove the unfinished export.
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.path + ".tmp"):
+            os.remove(self.path + ".tmp")
+
+# The manifest of a corpus build. It lists every record processed (by key and content digest), where each record's chops start in every output, and the size of every output at the last checkpoint.
+# This lets an interrupted build resume from its last checkpoint, and a rerun on an updated input only process new or changed records.
+# The key identifies everything else that affects the outputs (the engine code, penman version and options), so changing any of them starts a fresh build.
+class Manifest:
+    # The path of the manifest of the given output path and strategies.
+    @classmethod
+    def pathFor(cls, outpath, strategies):
+        return derivedPath(outpath, "-" + "-".join(strategies) + "-manifest", ".json")
+
+    def __init__(self, path, key, outputs):
+        self.path = path
+        self.key = key
+        # The names of the outputs ("strategy/variant"), in the order their offsets are listed for each record.
+        self.outputs = outputs
+        self.complete = False
+        # Whether the outputs have been compacted into new files, which may not all have been swapped in yet (see compact).
+        self.compacted = False
+        self.sizes = [0] * len(outputs)
+        # Each record is [key, digest, starts], where starts is None if the record produced no chops.
+        self.records = []
+        # The position of the current record of each key. Records replaced by a changed record with the same key are no longer current.
+        self.positions = {}
+
+    # Load the manifest from disk. Returns None if there is no manifest, or it was made with a different key or outputs.
+    @classmethod
+    def load(cls, path, key, outputs):
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if saved.get("key") != key or saved.get("outputs") != outputs:
+            return None
+        manifest = cls(path, key, outputs)
+        manifest.complete = saved["complete"]
+        manifest.compacted = saved.get("compacted", False)
+        manifest.sizes = saved["sizes"]
+        for record in saved["records"]:
+            manifest.add(*record)
+        return manifest
+
+    # Atomically save the manifest, with the given output sizes.
+    def save(self, sizes, complete=False, compacted=False):
+        self.sizes = sizes
+        self.complete = complete
+        self.compacted = compacted
+        with open(self.path + ".tmp", "w") as f:
+            json.dump({"key": self.key, "complete": complete, "compacted": compacted, "outputs": self.outputs, "sizes": sizes, "records": self.records}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    # Whether the record has already been processed, with the same contents.
+    def isDone(self, key, digest):
+        position = self.positions.get(key)
+        return position is not None and self.records[position][1] == digest
+
+    # Add a processed record. If it replaces a changed record with the same key, the old record's chops are dropped at the end of the run.
+    def add(self, key, digest, starts):
+        self.positions[key] = len(self.records)
+        self.records.append([key, digest, starts])
+
+    # Rewrite each output keeping only the chops of records that are still current, i.e. the current record of a key seen in this run's input, and update the manifest to match.
+    # The chops are written in the order of the input, so an incremental build has the same outputs as a fresh one, even though changed and new records were appended at the end.
+    # The paths are the files holding each output, in the same order as the outputs, and seen is the list of record keys in the input, in order.
+    # Returns the number of records dropped, or None if the outputs already held only current records, in order, so nothing was rewritten.
+    # The compacted outputs are written to new files next to the old ones, which stay untouched. The caller saves the manifest with compacted=True once they are written, then swaps them in with swapCompacted.
+    # So whenever the build is interrupted, the manifest on disk describes either the old outputs, or the compacted ones (swapped in or not), and never a mix of the two.
+    def compact(self, paths, seen):
+        # Every key in the input has a current record, as it was either done before or processed in this run.
+        order = [self.positions[key] for key in seen]
+        if order == list(range(len(self.records))):
+            return None
+        # A record's chops end where the next record with chops starts, or at the end of the output.
+        withChops = [position for position, record in enumerate(self.records) if record[2] is not None]
+        ends = {}
+        for current, following in zip(withChops, withChops[1:] + [None]):
+            ends[current] = self.records[following][2] if following is not None else self.sizes
+        newStarts = {position: [] for position in order if self.records[position][2] is not None}
+        newSizes = []
+        for column, path in enumerate(paths):
+            with open(path, "rb") as source, open(path + ".compact", "wb") as target:
+                for position in order:
+                    if position not in newStarts:
+                        continue
+                    start = self.records[position][2][column]
+                    newStarts[position].append(target.tell())
+                    source.seek(start)
+                    target.write(source.read(ends[position][column] - start))
+                newSizes.append(target.tell())
+                target.flush()
+                os.fsync(target.fileno())
+        # Rebuild the record list with only the kept records, in input order, at their new offsets.
+        dropped = len(self.records) - len(order)
+        records = [[self.records[position][0], self.records[position][1], newStarts.get(position)] for position in order]
+        self.records = []
+        self.positions = {}
+        for record in records:
+            self.add(*record)
+        self.sizes = newSizes
+        return dropped
+
+    # Move the compacted outputs into place. If this was interrupted, the outputs already moved have no compacted file left, so it can simply be run again.
+    @staticmethod
+    def swapCompacted(paths):
+        for path in paths:
+            if os.path.exists(path + ".compact"):
+                os.replace(path + ".compact", path)
+
+# The manifest key: a hash of the engine code (so that changing the chop rules starts a fresh build), the penman version, and the options that change the outputs.
+def manifestKey(strategies, allMentions, alignments=False):
+    with open(os.path.abspath(__file__), "rb") as f:
+        code = hashlib.sha256(f.read()).hexdigest()
+    return "%s-penman-%s-%s-allMentions-%s-alignments-%s" % (code, penman.__version__, "-".join(strategies), allMentions, alignments)
+
+# The id of a record, from its ::id metadata, and a digest of its contents, used to tell whether it has changed since the last run.
+ID_PATTERN = re.compile(r"::id\s+(\S+)")
+
+def recordDigest(AMRrecord):
+    return hashlib.blake2b(AMRrecord.encode("utf-8"), digest_size=16).hexdigest()
+
+def recordIdentity(AMRrecord):
+    # Records from the decoded-graph cache carry their digest with them.
+    if not isinstance(AMRrecord, str):
+        return AMRrecord[1][3].get("id"), AMRrecord[0]
+    match = ID_PATTERN.search(AMRrecord)
+    return match.group(1) if match else None, recordDigest(AMRrecord)
+
+# These patterns find the parts of a raw AMR record that the prefilter checks: the sentence, name and date nodes, and the constants that make up their labels.
+SNT_PATTERN = re.compile(r"::snt(?:[ \t](.*))?$", re.MULTILINE)
+NAME_PATTERN = re.compile(r"/\s*(?:name|date-entity)(?=[\s)~]|$)")
+ENTITY_PATTERN = re.compile(r"/\s*(?:name|[^\s()~]+-entity|[^\s()~]+-quantity)(?=[\s)~]|$)")
+LABEL_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"|:(?:op\d+|day|month|year|year2)\s+([^\s()"~]+)')
+
+# Cheaply check the raw text of an AMR record for chop candidates, so records without any can be skipped before decoding.
+# A record can only be chopped if it has a name or date-entity node, and part of a label (a quoted string, :op, or date constant) appears in its sentence.
+# This over-approximates the full check, so it never skips a record that would be chopped.
+# With alignments, labels need not appear in the sentence as they are in the graph, so any record with an entity node might be chopped.
+def mightChop(AMRrecord, alignments=False):
+    if alignments and ENTITY_PATTERN.search(AMRrecord) is not None:
+        return True
+    if NAME_PATTERN.search(AMRrecord) is None:
+        return False
+    snt = SNT_PATTERN.search(AMRrecord)
+    # Without a sentence the record cannot be checked here, so leave it to the full path.
+    if snt is None:
+        return True
+    utt = (snt.group(1) or "").replace(".","").replace("?","")
+    for match in LABEL_PATTERN.finditer(AMRrecord):
+        for part in (match.group(1) or match.group(2)).replace('"','').split():
+            if part in utt:
+                return True
+    return False
+
+# Given an AMR record, find where it can be chopped with every given strategy.
+# The record is decoded, indexed and matched against its labels only once, however many strategies are used. If alignments is True, the chop points of aligned records come from their alignments, and unaligned records fall back to matching labels.
+# The time spent in each step, and whether the record was aligned, are recorded in the given RunStats.
+# Returns the utterance (with the tokens of an aligned record), the graph and its index, the utterance tokens, and a dictionary from each strategy name to its list of chop points.
+def findChopPoints(AMRrecord, strategies, allMentions, alignments, stats):
+    # Extract the text sentence and the AMR graph from the record.
+    with stats.timer("decode"):
+        utterance, originalGraph = parseOriginal(AMRrecord)
+    # Index the graph once, then extract all the named entities from the triples in the AMR graph (or read the alignments, if the record has them).
+    with stats.timer("entities"):
+        index = GraphIndex(originalGraph.triples)
+        aligned = readAlignments(originalGraph) if alignments else None
+        if aligned is None:
+            nameNodes, nameLabels = getNameInfo(index)
+        else:
+            utterance, positions = alignedUtterance(originalGraph)
+    # Find every label occurrence in one pass over the utterance tokens (or look up every aligned span), then every chop point for each strategy, and the chop node, label and position of each.
+    with stats.timer("match"):
+        tokens = tokenize(utterance)
+        if aligned is None:
+            matches = matchLabels(tokens, nameNodes, nameLabels)
+            if alignments:
+                stats.counts["unaligned"] += 1
+        else:
+            nameNodes, nameLabels, matches = alignedNameInfo(index, aligned, positions, tokens)
+            stats.counts["aligned"] += 1
+        chopPoints = {name: STRATEGIES[name].willItChop(tokens, nameNodes, nameLabels, matches, allMentions) for name in strategies}
+    return utterance, originalGraph, index, tokens, chopPoints
+
+# Given an AMR record, process it and chop it with every given strategy, where appropriate.
+# The chop points are found by findChopPoints. If allMentions is True, every mention of a label is disrupted rather than only the first, and alignments is as for findChopPoints.
+# Unless prefilter is False, records that mightChop rules out are skipped without being decoded. If verifyPrefilter is True, they are still chopped, to check the prefilter never skips a record that would be chopped.
+# Returns a dictionary from each strategy name to its list of encoded chops, so that records can be processed in worker processes and stored in order, and the RunStats of the record.
+# Each chop is the encoded original, incomplete and completion graphs, followed by the details of where the record was chopped (for the structured export).
+def processRecord(AMRrecord, strategies, allMentions=False, prefilter=True, verifyPrefilter=False, alignments=False):
+    chops = {name: [] for name in strategies}
+    stats = RunStats()
+    stats.counts["records"] += 1
+    # Records from the decoded-graph cache have nothing left to save, so are never prefiltered.
+    with stats.timer("prefilter"):
+        skipped = prefilter and isinstance(AMRrecord, str) and not mightChop(AMRrecord, alignments)
+    if skipped:
+        stats.counts["skipped"] += 1
+        if not verifyPrefilter:
+            return chops, stats
+    utterance, originalGraph, index, tokens, chopPoints = findChopPoints(AMRrecord, strategies, allMentions, alignments, stats)
+    if any(chopPoints.values()):
+        stats.counts["choppable"] += 1
+    cache = {}
+    for name in strategies:
+        strategy = STRATEGIES[name]
+        for chopNode, chopLabel, chopSpan in chopPoints[name]:
+            with stats.timer("chop"):
+                choppedUtt = strategy.chopUtterance(utterance, tokens, chopSpan)
+            # Some AMR examples are just named entities, so check that the incomplete sentence (gh1) is not empty.
+            # Note, thanks to the replace, this works even when the UNK tag is added when chopping.
+            if choppedUtt.replace(" UNK", "") == '':
+                stats.counts["emptyIncomplete"] += 1
+                continue
+            # Chop the AMR graph into gh1 and gh2 (gh = graph half) at the identified node, and keep if chopped sucessfully.
+            encoded = encodeChop(originalGraph, choppedUtt, index, chopNode, chopLabel, cache, stats)
+            if encoded is not None:
+                details = {"id": originalGraph.metadata.get("id"), "strategy": name, "node": chopNode, "label": chopLabel, "tokenStart": chopSpan[0], "tokenEnd": chopSpan[1]}
+                chops[name].append(encoded + (details,))
+                stats.counts["chops"] += 1
+                stats.counts["chops." + name] += 1
+    # If the prefilter would have skipped a record that was chopped, report it.
+    if skipped and any(chops.values()):
+        stats.counts["prefilterMisses"] += 1
+        stats.prefilterMisses.append(originalGraph.metadata.get("id"))
+    return chops, stats
+
+# Given a file opened in binary mode, lazily yield one AMR record (as a string) at a time.
+# Records are separated by one or more empty lines, which may end in either "\n" or "\r\n".
+# Blocks containing only comments (such as the AMR release header) have no graph to decode, so they are skipped.
+# If a progress bar is given, it is advanced by the number of bytes read.
+def readRecords(f, progress=None):
+    lines = []
+    hasGraph = False
+    for line in f:
+        if progress is not None:
+            progress.update(len(line))
+        line = line.decode("utf-8").rstrip("\r\n")
+        # An empty line ends the current record, if it contains a graph. Lines of only whitespace do not, as they can appear inside a graph.
+        if line == "":
+            if hasGraph:
+                yield "\n".join(lines)
+            lines = []
+            hasGraph = False
+        else:
+            lines.append(line)
+            if line.strip() and not line.lstrip().startswith("#"):
+                hasGraph = True
+    # The last record in the file might not be followed by a blank line.
+    if hasGraph:
+        yield "\n".join(lines)
+
+# Lazily disrupt an AMR source in memory, e.g. to generate fresh disruptions every epoch of training without writing any corpora to disk.
+# The source can be the path of an AMR file, a file opened in binary mode, or any iterable of AMR records (as strings).
+# Yields an (original, incomplete, completion) tuple of penman graphs for every chop of the given strategy, or of encoded AMR strings if encode is True.
+# Chops that cannot make two rooted graphs are always skipped (as in the corpora), but the odd chop that penman cannot encode is only caught, and skipped, with encode=True.
+# If sample is True, one chop is picked at random for each sentence that can be chopped, rather than yielding them all. The same seed always picks the same chops.
+# allMentions and alignments are as for processRecord.
+def iterDisruptions(source, strategy="anywhere", encode=False, sample=False, seed=None, allMentions=False, alignments=False):
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            yield from iterDisruptions(f, strategy, encode, sample, seed, allMentions, alignments)
+        return
+    if hasattr(source, "read"):
+        source = readRecords(source)
+    strategy = STRATEGIES[strategy]
+    rng = random.Random(seed)
+    for AMRrecord in source:
+        if not mightChop(AMRrecord, alignments):
+            continue
+        # The stats of the record are not reported, but findChopPoints and encodeChop need somewhere to record them.
+        stats = RunStats()
+        utterance, originalGraph, index, tokens, chopPoints = findChopPoints(AMRrecord, [strategy.name], allMentions, alignments, stats)
+        chopPoints = chopPoints[strategy.name]
+        # When sampling, try the chop points in a random order and keep the first that chops successfully.
+        if sample:
+            chopPoints = rng.sample(chopPoints, len(chopPoints))
+        cache = {}
+        for chopNode, chopLabel, chopSpan in chopPoints:
+            choppedUtt = strategy.chopUtterance(utterance, tokens, chopSpan)
+            if choppedUtt.replace(" UNK", "") == '':
+                continue
+            if encode:
+                chop = encodeChop(originalGraph, choppedUtt, index, chopNode, chopLabel, cache, stats)
+                if chop is None:
+                    continue
+            else:
+                halves = chopAMR(choppedUtt, originalGraph, index, chopNode, chopLabel)
+                if halves is None:
+                    continue
+                chop = (originalGraph,) + halves
+            yield chop
+            if sample:
+                break
+
+# Apply the function to a chunk of AMR records in a worker process.
+def mapChunk(function, records):
+    return [function(record) for record in records]
+
+# Group the records into lists of chunkSize records.
+def chunked(records, chunkSize):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunkSize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Apply the function to every record, yielding the results in input order.
+# With more than one worker, chunks of records are fanned out to a process pool. Only a bounded number of chunks are in flight at once, so memory stays flat.
+def mapRecords(function, records, workers=1, chunkSize=64):
+    if workers <= 1:
+        yield from map(function, records)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        pending = collections.deque()
+        for chunk in chunked(records, chunkSize):
+            pending.append(pool.apply_async(mapChunk, (function, chunk)))
+            # Wait on the oldest chunk, so results are always yielded in the same order as the input.
+            if len(pending) > 2 * workers:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+# Process every record, yielding the chops and stats of each record in input order. Any options are passed on to processRecord.
+def processRecords(records, workers=1, chunkSize=64, **options):
+    return mapRecords(functools.partial(processRecord, **options), records, workers, chunkSize)
+
+# The format of the decoded-graph cache. Increase this whenever the cached records change, so that old caches are rebuilt.
+CACHE_FORMAT = 2
+
+# The cache key of an input file: the hash of its contents, the penman version that decoded it, and the cache format.
+def cacheKey(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1048576), b""):
+            digest.update(block)
+    return "%s-penman-%s-format-%d" % (digest.hexdigest(), penman.__version__, CACHE_FORMAT)
+
+# Decode an AMR record into the digest of its text and the parts of its graph kept in the cache.
+def decodeRecord(AMRrecord):
+    graph = penman.decode(AMRrecord)
+    return recordDigest(AMRrecord), (graph.triples, graph.top, graph.epidata, graph.metadata)
+
+# Decode every record into the decoded-graph cache. The cache is a header holding its key, then one pickle per record, then None to mark the end.
+# It is written to a temporary file and only moved into place once complete, so an interrupted build never leaves a partial cache behind.
+def buildCache(cachePath, key, records, workers=1, chunkSize=64):
+    try:
+        with open(cachePath + ".tmp", "wb") as f:
+            pickle.dump({"key": key}, f, pickle.HIGHEST_PROTOCOL)
+            for decoded in mapRecords(decodeRecord, records, workers, chunkSize):
+                pickle.dump(decoded, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(None, f, pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        os.remove(cachePath + ".tmp")
+        raise
+    os.replace(cachePath + ".tmp", cachePath)
+
+# Memory-map the decoded-graph cache, positioned at its first record. Returns None if the cache is missing, or stale because its key does not match.
+def openCache(cachePath, key):
+    try:
+        with open(cachePath, "rb") as f:
+            cache = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        header = pickle.load(cache)
+    except Exception:
+        header = None
+    if not isinstance(header, dict) or header.get("key") != key:
+        cache.close()
+        return None
+    return cache
+
+# Lazily yield the decoded records from a memory-mapped cache, so only the records being processed are ever read.
+# If a progress bar is given, it is advanced by the number of bytes read.
+def readCachedRecords(cache, progress=None):
+    while True:
+        position = cache.tell()
+        decoded = pickle.load(cache)
+        if progress is not None:
+            progress.update(cache.tell() - position)
+        if decoded is None:
+            return
+        yield decoded
+
+# Prepare the temporary outputs for resuming a build from its manifest. If the build was interrupted, its temporary outputs are resumed from the last checkpoint.
+# If it completed, its finished outputs are copied to the temporary outputs, so that they stay intact until this run completes too.
+# The paths are the final path of each output, in manifest order. Returns False if the outputs on disk do not match the manifest, so the build must start afresh.
+def resumeOutputs(manifest, paths):
+    # If the last run was interrupted after compacting its outputs, finish swapping them in. Otherwise, any compacted outputs are from an unfinished compaction and are discarded.
+    if not manifest.complete:
+        if manifest.compacted:
+            Manifest.swapCompacted([path + ".tmp" for path in paths])
+        else:
+            for path in paths:
+                if os.path.exists(path + ".tmp.compact"):
+                    os.remove(path + ".tmp.compact")
+    for path, size in zip(paths, manifest.sizes):
+        if manifest.complete:
+            if not os.path.exists(path) or os.path.getsize(path) != size:
+                return False
+        elif not os.path.exists(path + ".tmp") or os.path.getsize(path + ".tmp") < size:
+            return False
+    if manifest.complete:
+        for path in paths:
+            shutil.copyfile(path, path + ".tmp")
+    return True
+
+# Yield the records that are new or have changed since they were added to the manifest, skipping those already done.
+# Each record is keyed by its id (or digest, if it has none), numbered if the id repeats. The keys of every record are appended to seen, in input order, and the key and digest of each record yielded are queued in pending.
+def newRecords(records, manifest, seen, pending, stats):
+    occurrences = collections.Counter()
+    for record in records:
+        recordId, digest = recordIdentity(record)
+        key = recordId or digest
+        occurrences[key] += 1
+        if occurrences[key] > 1:
+            key = "%s#%d" % (key, occurrences[key])
+        seen.append(key)
+        if manifest.isDone(key, digest):
+            stats.counts["unchanged"] += 1
+            continue
+        pending.append((key, digest))
+        yield record
+
+# Chop the AMR file with the given strategies and command line arguments, storing the chopped corpora. Returns the RunStats of the run.
+# Progress is checkpointed to a manifest, so that an interrupted run resumes where it left off, and a rerun only processes new or changed records.
+def chopFile(args, strategies):
+    # Using the provided input AMR path, set the output path to store chopped data.
+    outpath = outputPath(args.filepath)
+    totals = RunStats()
+    outputs = [name + "/" + variant for name in strategies for variant in CorpusWriter.variants]
+    paths = [CorpusWriter.variantPaths(outpath, STRATEGIES[name].suffix)[variant] for name in strategies for variant in CorpusWriter.variants]
+
+    # Resume from the manifest of a previous run, unless a fresh build was asked for or the previous run can't be resumed.
+    # The structured export is written in the same pass as the outputs, so it needs a fresh build too, as unchanged records are not processed again.
+    manifestPath = Manifest.pathFor(outpath, strategies)
+    key = manifestKey(strategies, args.all_mentions, args.alignments)
+    manifest = None if args.fresh or args.export else Manifest.load(manifestPath, key, outputs)
+    if manifest is not None and not resumeOutputs(manifest, paths):
+        manifest = None
+    resumeSizes = {name: None for name in strategies}
+    if manifest is None:
+        manifest = Manifest(manifestPath, key, outputs)
+    else:
+        for name in strategies:
+            resumeSizes[name] = {variant: manifest.sizes[outputs.index(name + "/" + variant)] for variant in CorpusWriter.variants}
+
+    with contextlib.ExitStack() as stack:
+        if args.cache_dir:
+            # Use the decoded-graph cache if it is still valid for this input, and rebuild it first if not.
+            os.makedirs(args.cache_dir, exist_ok=True)
+            # The cache is named by a hash of the input's absolute path too, as inputs in different directories can share a name (e.g. the AMR 3.0 training, dev and test splits).
+            pathHash = hashlib.sha256(os.path.abspath(args.filepath).encode("utf-8")).hexdigest()[:16]
+            cachePath = os.path.join(args.cache_dir, os.path.basename(args.filepath) + "-" + pathHash + ".cache")
+            cacheId = cacheKey(args.filepath)
+            cache = openCache(cachePath, cacheId)
+            if cache is None:
+                with open(args.filepath, "rb") as f, tqdm(total=os.path.getsize(args.filepath), unit="B", unit_scale=True, desc="Decoding") as progress, totals.timer("decode"):
+                    buildCache(cachePath, cacheId, readRecords(f, progress), args.workers, args.chunk_size)
+                cache = openCache(cachePath, cacheId)
+            cache = stack.enter_context(cache)
+            progress = stack.enter_context(tqdm(total=len(cache), initial=cache.tell(), unit="B", unit_scale=True))
+            records = readCachedRecords(cache, progress)
+        else:
+            # Stream the records one at a time so memory stays flat, and drive the progress bar by the bytes read.
+            f = stack.enter_context(open(args.filepath, "rb"))
+            progress = stack.enter_context(tqdm(total=os.path.getsize(args.filepath), unit="B", unit_scale=True))
+            records = readRecords(f, progress)
+        writers = {}
+        for name in strategies:
+            writers[name] = CorpusWriter(outpath, STRATEGIES[name].suffix, args.flush_size, resumeSizes[name])
+            # If the run fails, the temporary outputs are closed but kept, so the run can be resumed.
+            stack.callback(writers[name].abort)
+        exporter = None
+        if args.export:
+            exporter = ChopExporter(ChopExporter.exportPath(outpath, strategies, args.export), args.export)
+            stack.callback(exporter.abort)
+
+        seen = []
+        pending = collections.deque()
+        sinceCheckpoint = 0
+        for chops, stats in processRecords(newRecords(records, manifest, seen, pending, totals), args.workers, args.chunk_size, strategies=strategies, allMentions=args.all_mentions, prefilter=args.prefilter, verifyPrefilter=args.verify_prefilter, alignments=args.alignments):
+            totals.merge(stats)
+            recordKey, digest = pending.popleft()
+            with totals.timer("write"):
+                # Note where the record's chops start in every output, so they can be dropped if the record changes.
+                starts = None
+                if any(chops.values()):
+                    starts = [writers[name].sizes[variant] for name in strategies for variant in CorpusWriter.variants]
+                for name, strategyChops in chops.items():
+                    for chop in strategyChops:
+                        writers[name].store(*chop[:3])
+                        if exporter is not None:
+                            exporter.add(chop)
+                manifest.add(recordKey, digest, starts)
+                sinceCheckpoint += 1
+                if sinceCheckpoint >= args.checkpoint_every:
+                    sizes = {name: writer.checkpoint() for name, writer in writers.items()}
+                    manifest.save([sizes[name][variant] for name in strategies for variant in CorpusWriter.variants])
+                    sinceCheckpoint = 0
+
+        # Finishing the outputs is part of the write stage too: drop the chops of records that changed or are no longer in the input, then move the outputs into place.
+        # Every step is saved in the manifest before the next, so the build can be resumed wherever it is interrupted.
+        with totals.timer("write"):
+            sizes = {name: writer.checkpoint() for name, writer in writers.items()}
+            for writer in writers.values():
+                writer.finish()
+            manifest.save([sizes[name][variant] for name in strategies for variant in CorpusWriter.variants])
+            dropped = manifest.compact([path + ".tmp" for path in paths], seen)
+            if dropped is not None:
+                manifest.save(manifest.sizes, compacted=True)
+                Manifest.swapCompacted([path + ".tmp" for path in paths])
+                totals.counts["dropped"] += dropped
+            for writer in writers.values():
+                writer.commit()
+            if exporter is not None:
+                exporter.close()
+            manifest.save(manifest.sizes, complete=True)
+    return totals
+
+# Batch mode processes every AMR file in a directory (including its subdirectories) or matching a glob, e.g. all the AMR 3.0 split files in one run.
+# Inputs can be compressed with gzip (.txt.gz) or zstandard (.txt.zst), and are decompressed as they are streamed.
+INPUT_EXTENSIONS = (".txt", ".txt.gz", ".txt.zst")
+SHARD_EXTENSIONS = {"gz": ".gz", "zst": ".zst", "none": ""}
+
+# Whether the input path is for batch mode: a directory, a glob, or a compressed file.
+def isBatch(filepath):
+    return os.path.isdir(filepath) or any(c in filepath for c in "*?[") or filepath.endswith((".gz", ".zst"))
+
+# Whether the path is the directory or inside it.
+def isWithin(path, directory):
+    directory = os.path.abspath(directory)
+    return os.path.commonpath([os.path.abspath(path), directory]) == directory
+
+# Find every input file in the directory or matching the glob, in sorted order.
+# Files within the excluded directory (e.g. the shards of an earlier run, which are named like compressed inputs) are skipped.
+def findInputs(filepath, exclude=None):
+    if os.path.isdir(filepath):
+        paths = [os.path.join(directory, name) for directory, _, names in os.walk(filepath) for name in names]
+    else:
+        paths = glob.glob(filepath)
+    return sorted(path for path in paths if path.endswith(INPUT_EXTENSIONS) and os.path.isfile(path) and not (exclude is not None and isWithin(path, exclude)))
+
+# zstandard is only needed for .zst files, so it is only imported when one is used.
+def importZstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("reading or writing .zst files needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+# Open an input file for reading in binary mode, decompressing it as it is read.
+def openInput(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        reader = importZstandard().ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader)
+    return open(path, "rb")
+
+# Open an output file for writing in binary mode, compressing it as it is written.
+def openOutput(path, compression):
+    if compression == "gz":
+        return gzip.open(path, "wb", compresslevel=6)
+    if compression == "zst":
+        return importZstandard().ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+    return open(path, "wb")
+
+# Stores the chopped corpora of one input as compressed shards, starting a new shard of a variant whenever the current one holds shardSize (uncompressed) bytes.
+# The chops of a record are never split across shards. Each shard is written to a temporary file, which is only renamed into place when the writer is closed.
+class ShardWriter:
+    def __init__(self, outpath, suffix="", shardSize=67108864, compression="gz"):
+        self.shardSize = shardSize
+        self.compression = compression
+        self.paths = CorpusWriter.variantPaths(outpath, suffix)
+        self.files = {}
+        # The path, number of graphs and uncompressed size of every shard of each variant, in order.
+        self.shards = {variant: [] for variant in self.paths}
+
+    # Close the variant's current shard, if any, and start the next one.
+    def nextShard(self, variant):
+        if variant in self.files:
+            self.files[variant].close()
+        path = derivedPath(self.paths[variant], "-%05d" % len(self.shards[variant]), ".txt" + SHARD_EXTENSIONS[self.compression])
+        self.files[variant] = openOutput(path + ".tmp", self.compression)
+        self.shards[variant].append({"path": path, "graphs": 0, "bytes": 0})
+
+    # Start storing the chops of the next record. This must be called before storing them.
+    # Every variant moves on to its next shard together, once any of them is full, so a record's chops are never split across shards and the nth shard of every variant holds the same records.
+    def startRecord(self):
+        if not self.files or any(self.shards[variant][-1]["bytes"] >= self.shardSize for variant in self.paths):
+            for variant in self.paths:
+                self.nextShard(variant)
+
+    # Write the encoded original graph and graph halves to the current shard of every variant.
+    def store(self, pmoriginal, pmgh1, pmgh2):
+        graphs = [(graph + "\n\n").encode("utf-8") for graph in (pmoriginal, pmgh1, pmgh2)]
+        for variant, parts in CorpusWriter.variants.items():
+            data = b"".join(graphs[part] for part in parts)
+            self.files[variant].write(data)
+            self.shards[variant][-1]["graphs"] += len(parts)
+            self.shards[variant][-1]["bytes"] += len(data)
+
+    # Close the shards and move them into place. Returns the shards of every variant.
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        for shards in self.shards.values():
+            for shard in shards:
+                os.replace(shard["path"] + ".tmp", shard["path"])
+        return self.shards
+
+    # Close and remove the temporary shards, as a failed batch is not resumed.
+    def abort(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        for shards in self.shards.values():
+            for shard in shards:
+                if os.path.exists(shard["path"] + ".tmp"):
+                    os.remove(shard["path"] + ".tmp")
+
+# Chop one input file of a batch into shards, in a worker process, and export its chops if exportFormat is given. Any options are passed on to processRecord.
+# Returns the input path, the shards written for every strategy and variant, the export path (or None), and the RunStats of the whole file.
+def chopInput(paths, strategies, shardSize, compression, exportFormat=None, **options):
+    inpath, outpath = paths
+    totals = RunStats()
+    with contextlib.ExitStack() as stack:
+        f = stack.enter_context(openInput(inpath))
+        writers = {}
+        for name in strategies:
+            writers[name] = ShardWriter(outpath, STRATEGIES[name].suffix, shardSize, compression)
+            stack.callback(writers[name].abort)
+        exporter = None
+        if exportFormat:
+            exporter = ChopExporter(ChopExporter.exportPath(outpath, strategies, exportFormat), exportFormat)
+            stack.callback(exporter.abort)
+        for AMRrecord in readRecords(f):
+            chops, stats = processRecord(AMRrecord, strategies, **options)
+            totals.merge(stats)
+            with totals.timer("write"):
+                for name, strategyChops in chops.items():
+                    # Records without chops never start a shard.
+                    if strategyChops:
+                        writers[name].startRecord()
+                    for chop in strategyChops:
+                        writers[name].store(*chop[:3])
+                        if exporter is not None:
+                            exporter.add(chop)
+        shards = {}
+        with totals.timer("write"):
+            for name, writer in writers.items():
+                for variant, variantShards in writer.close().items():
+                    shards[name + "/" + variant] = variantShards
+            if exporter is not None:
+                exporter.close()
+    return inpath, shards, exporter.path if exporter is not None else None, totals
+
+# The path of the shard index of a batch run.
+def batchIndexPath(args, strategies):
+    return os.path.join(args.output_dir, "-".join(strategies) + "-index.json")
+
+# Find the input files of a batch, and the output path of each. The outputs of each input keep its path relative to the inputs, under the output directory.
+# The output directory can be inside the input directory, in which case it is skipped, but not the other way round.
+# Returns a list of (input path, output path) pairs, or raises a ValueError if the inputs are in the output directory, if there are no inputs, or if two inputs would be written to the same outputs (e.g. a.txt and a.txt.gz).
+def batchJobs(filepath, outputDir):
+    # The inputs are searched for in the directory itself, or in the directory of the glob (or compressed file) before any wildcard.
+    root = filepath if os.path.isdir(filepath) else os.path.dirname(re.split(r"[*?[]", filepath)[0]) or "."
+    if isWithin(root, outputDir):
+        raise ValueError("the output directory %s contains the inputs %s" % (outputDir, filepath))
+    inputs = findInputs(filepath, outputDir)
+    if not inputs:
+        raise ValueError("no %s files found in %s" % (", ".join(INPUT_EXTENSIONS), filepath))
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in inputs])
+    jobs = []
+    inpaths = {}
+    for inpath in inputs:
+        name = os.path.relpath(os.path.abspath(inpath), base)
+        outpath = os.path.join(outputDir, name[:name.rindex(".txt")] + ".txt")
+        if outpath in inpaths:
+            raise ValueError("the inputs %s and %s would both be written to %s" % (inpaths[outpath], inpath, outpath))
+        inpaths[outpath] = inpath
+        jobs.append((inpath, outpath))
+    return jobs
+
+# Chop every input file of a batch, spreading the files across the worker processes. The shards of every input are listed in the index file.
+def chopBatch(args, strategies):
+    totals = RunStats()
+    jobs = batchJobs(args.filepath, args.output_dir)
+    for inpath, outpath in jobs:
+        os.makedirs(os.path.dirname(outpath), exist_ok=True)
+
+    index = {"strategies": strategies, "compression": args.shard_compression, "shardSize": args.shard_size, "inputs": []}
+    chop = functools.partial(chopInput, strategies=strategies, shardSize=args.shard_size, compression=args.shard_compression, exportFormat=args.export,
+                             allMentions=args.all_mentions, prefilter=args.prefilter, verifyPrefilter=args.verify_prefilter, alignments=args.alignments)
+    with tqdm(total=len(jobs), unit="file") as progress:
+        for inpath, shards, exportPath, stats in mapRecords(chop, jobs, args.workers, 1):
+            totals.merge(stats)
+            totals.counts["inputs"] += 1
+            totals.counts["shards"] += sum(len(variantShards) for variantShards in shards.values())
+            # Shard paths are relative to the index, so the outputs can be moved together.
+            for variantShards in shards.values():
+                for shard in variantShards:
+                    shard["path"] = os.path.relpath(shard["path"], args.output_dir)
+            entry = {"input": inpath, "records": stats.counts["records"], "shards": shards}
+            if exportPath is not None:
+                entry["export"] = os.path.relpath(exportPath, args.output_dir)
+            index["inputs"].append(entry)
+            progress.update(1)
+
+    indexPath = batchIndexPath(args, strategies)
+    with open(indexPath + ".tmp", "w") as f:
+        json.dump(index, f, indent=2)
+        f.write("\n")
+    os.replace(indexPath + ".tmp", indexPath)
+    return totals
+
+# This function checks for the filepath input, parses the AMR and sends each AMR record for processing.
+# The strategies to use are selected with command line flags, falling back to defaultStrategies if none are given.
+# At the end of the run, the run statistics are written as JSON, and the main process can optionally be profiled with cProfile.
+def processFile(defaultStrategies=tuple(STRATEGIES)):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filepath", help="the AMR file to process, e.g. ./input/amrFile.txt, or for batch mode a directory, glob or compressed (.txt.gz or .txt.zst) file")
+    for name, strategy in STRATEGIES.items():
+        parser.add_argument("--" + name, dest="strategies", action="append_const", const=name, help=strategy.description)
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="number of records sent to a worker at a time (default: 64)")
+    parser.add_argument("--flush-size", type=int, default=1048576, help="number of bytes buffered before writing to the outputs (default: 1048576)")
+    parser.add_argument("--all-mentions", action="store_true", help="with --anywhere, disrupt every mention of a repeated label, not only the first")
+    parser.add_argument("--alignments", action="store_true", help="find chop points from the ::alignments metadata (or surface alignments) of each record, falling back to matching labels for unaligned records")
+    parser.add_argument("--no-prefilter", dest="prefilter", action="store_false", help="decode every record, rather than skipping those the raw text shows cannot be chopped")
+    parser.add_argument("--verify-prefilter", action="store_true", help="chop the records the prefilter skips too, and report any that it should not have skipped")
+    parser.add_argument("--cache-dir", help="keep the decoded AMR graphs in this directory, so later runs on the same input skip decoding")
+    parser.add_argument("--fresh", action="store_true", help="rebuild the outputs from scratch, rather than resuming from the manifest of a previous run")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="number of records processed between manifest checkpoints (default: 1000)")
+    parser.add_argument("--stats", help="where to write the run statistics as JSON (default: the output path ending in -<strategies>-stats.json, or <output-dir>/<strategies>-stats.json in batch mode)")
+    parser.add_argument("--export", choices=sorted(ChopExporter.extensions), help="also export every chop as a structured row (id, strategy, node, label, token span and graphs) in this format; parquet needs pyarrow")
+    parser.add_argument("--output-dir", default="./output", help="in batch mode, the directory to write the shards to (default: ./output)")
+    parser.add_argument("--shard-size", type=int, default=67108864, help="in batch mode, the number of uncompressed bytes after which a new shard is started (default: 67108864)")
+    parser.add_argument("--shard-compression", choices=sorted(SHARD_EXTENSIONS), default="gz", help="in batch mode, how to compress the shards (default: gz)")
+    parser.add_argument("--profile", help="profile the run with cProfile and write the profile here (only the main process is profiled when using --workers)")
+    args = parser.parse_args()
+    # Each strategy is only applied once, even if its flag is repeated.
+    strategies = list(dict.fromkeys(args.strategies or defaultStrategies))
+    # Batch mode always rebuilds its shards, so it has no cache or manifest.
+    batch = isBatch(args.filepath)
+    if batch and args.cache_dir:
+        parser.error("--cache-dir can only be used with a single uncompressed input file")
+    chop = chopBatch if batch else chopFile
+    # Check that the batch has inputs, and that no two of them would be written to the same outputs, before any outputs are written.
+    if batch:
+        try:
+            batchJobs(args.filepath, args.output_dir)
+        except ValueError as error:
+            parser.error(str(error))
+    # Check that the Parquet export can be written before any outputs are.
+    if args.export == "parquet":
+        try:
+            importPyarrow()
+        except ImportError as error:
+            parser.error(str(error))
+
+    if args.stats:
+        statsPath = args.stats
+    elif batch:
+        statsPath = os.path.join(args.output_dir, "-".join(strategies) + "-stats.json")
+    else:
+        statsPath = derivedPath(outputPath(args.filepath), "-" + "-".join(strategies) + "-stats", ".json")
+    # Never let an output overwrite the input it is made from.
+    paths = [statsPath]
+    if not batch:
+        outpath = outputPath(args.filepath)
+        for name in strategies:
+            for path in CorpusWriter.variantPaths(outpath, STRATEGIES[name].suffix).values():
+                paths += [path, path + ".tmp"]
+        paths.append(Manifest.pathFor(outpath, strategies))
+        if args.export:
+            paths.append(ChopExporter.exportPath(outpath, strategies, args.export))
+    for path in paths:
+        if os.path.abspath(path) == os.path.abspath(args.filepath):
+            parser.error("the output %s would overwrite the input" % path)
+
+    start = time.perf_counter()
+    if args.profile:
+        profiler = cProfile.Profile()
+        totals = profiler.runcall(chop, args, strategies)
+        profiler.dump_stats(args.profile)
+    else:
+        totals = chop(args, strategies)
+    elapsed = time.perf_counter() - start
+
+    # Write the run statistics, so that runs can be compared and regressions caught between corpus builds.
+    report = {
+        "input": args.filepath,
+        "strategies": strategies,
+        "workers": args.workers,
+        "elapsedSeconds": round(elapsed, 6),
+        "recordsPerSecond": round(totals.counts["records"] / elapsed, 3) if elapsed > 0 else None,
+    }
+    report.update(totals.report())
+    with open(statsPath, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
+
+    print("Chopped %d of %d records into %d chops (%d skipped by the prefilter, %d empty incomplete, %d invalid chops, %d layout failures)" % (
+        totals.counts["choppable"], totals.counts["records"], totals.counts["chops"],
+        totals.counts["skipped"], totals.counts["emptyIncomplete"], totals.counts["invalidChops"], totals.counts["layoutFailures"]))
+    if totals.counts["unchanged"] or totals.counts["dropped"]:
+        print("Kept %d unchanged records from the previous run, and dropped %d changed or removed records" % (totals.counts["unchanged"], totals.counts["dropped"]))
+    if batch:
+        print("Wrote %d shards from %d input files, listed in %s" % (totals.counts["shards"], totals.counts["inputs"], batchIndexPath(args, strategies)))
+    if args.export and not batch:
+        print("Exported the chops to " + ChopExporter.exportPath(outputPath(args.filepath), strategies, args.export))
+    if args.alignments:
+        print("Found the chop points of %d records from their alignments (%d unaligned records were matched by label)" % (totals.counts["aligned"], totals.counts["unaligned"]))
+    if args.verify_prefilter:
+        print("Prefilter skipped %d records that would have been chopped" % totals.counts["prefilterMisses"])
+    print("Run statistics written to " + statsPath)
+
+# Chop the file given as a system argument input, with every strategy unless some are selected.
+if __name__ == "__main__":
+    processFile()
@@ -0,0 +1,98 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: CC-BY-NC-4.0
+
+import unittest
+import sys
+import io
+import os
+
+import penman
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import engine_AMR
+
+# Decode the given graph and chop it at the given node, returning the triples of both halves as sets (or None if the chop is rejected).
+def chop(amr, node, label=None):
+    graph = penman.decode(amr)
+    halves = engine_AMR.chopTriples(engine_AMR.GraphIndex(graph.triples), node, graph.top, label)
+    if halves is None:
+        return None
+    return set(halves[0]), set(halves[1])
+
+class ChopTriplesTest(unittest.TestCase):
+    def testLeaf(self):
+        half1, half2 = chop('(m / meet-03 :ARG1 (c / country :name (n / name :op1 "France")))', "n")
+        self.assertEqual(half1, {("m", ":instance", "meet-03"), ("m", ":ARG1", "c"), ("c", ":instance", "country"), ("c", ":name", "UNK")})
+        self.assertEqual(half2, {("n", ":instance", "name"), ("n", ":op1", '"France"')})
+
+    # The whole subgraph below the chop node moves to the completion, however deep.
+    def testNestedChildren(self):
+        half1, half2 = chop('(m / meet-03 :ARG0 (p / person) :ARG1 (c / country :name (n / name :op1 "France") :part (r / region :name (n2 / name :op1 "Alsace"))))', "c", "France Alsace")
+        self.assertEqual(half1, {("m", ":instance", "meet-03"), ("m", ":ARG0", "p"), ("p", ":instance", "person"), ("m", ":ARG1", "UNK")})
+        self.assertEqual(half2, {
+            ("c", ":instance", "country"), ("c", ":name", "n"), ("n", ":instance", "name"), ("n", ":op1", '"France"'), ("c", ":part", "r"),
+            ("r", ":instance", "region"), ("r", ":name", "n2"), ("n2", ":instance", "name"), ("n2", ":op1", '"Alsace"'),
+        })
+
+    # A node the completion shares with the first half is copied into the completion as a leaf, without its edges.
+    def testSharedNode(self):
+        half1, half2 = chop('(m / meet-03 :ARG0 (p / person :name (n / name :op1 "John")) :ARG1 (d / deal :ARG0 p))', "d")
+        self.assertEqual(half1, {("m", ":instance", "meet-03"), ("m", ":ARG0", "p"), ("p", ":instance", "person"), ("p", ":name", "n"), ("n", ":instance", "name"), ("n", ":op1", '"John"'), ("m", ":ARG1", "UNK")})
+        self.assertEqual(half2, {("d", ":instance", "deal"), ("d", ":ARG0", "p"), ("p", ":instance", "person")})
+
+    # A re-entrant chop node is replaced by UNK wherever it is referred to, and keeps its subgraph.
+    def testReentrantNode(self):
+        half1, half2 = chop('(m / meet-03 :ARG0 (p / person :name (n / name :op1 "John")) :ARG1 (d / deal :ARG0 p))', "p")
+        self.assertEqual(half1, {("m", ":instance", "meet-03"), ("m", ":ARG0", "UNK"), ("m", ":ARG1", "d"), ("d", ":instance", "deal"), ("d", ":ARG0", "UNK")})
+        self.assertEqual(half2, {("p", ":instance", "person"), ("p", ":name", "n"), ("n", ":instance", "name"), ("n", ":op1", '"John"')})
+
+    def testTop(self):
+        self.assertIsNone(chop('(m / meet-03 :ARG1 (c / country))', "m"))
+
+    # Chopping the year would move Monday into the completion, while the utterance only loses "2004".
+    def testLabelOutsideSpan(self):
+        amr = '(m / meet-03 :time (d / date-entity :year 2004 :mod (w / weekday :name (n / name :op1 "Monday"))))'
+        self.assertIsNone(chop(amr, "d", "2004"))
+        self.assertIsNotNone(chop(amr, "d"))
+
+    def testLabelOutsideSpanRejectedByChopAMR(self):
+        graph = penman.decode('# ::id test.1\n# ::snt He met her on Monday of 2004\n(m / meet-03 :time (d / date-entity :year 2004 :mod (w / weekday :name (n / name :op1 "Monday"))))')
+        stats = engine_AMR.RunStats()
+        self.assertIsNone(engine_AMR.encodeChop(graph, "He met her on Monday of", engine_AMR.GraphIndex(graph.triples), "d", "2004", {}, stats))
+        self.assertEqual(stats.invalidChops, ["test.1"])
+
+# A graph with a re-entrancy (p) before an aligned entity (France).
+REENTRANT = '(a / and :op1 (p / person :name (n / name :op1 "John")) :op2 (m / meet-03 :ARG0 p :ARG1 (c / country :name (n2 / name :op1 "France"))))'
+
+class AlignmentsTest(unittest.TestCase):
+    # Re-entrant references are not children in JAMR addresses, so c is the first child of m.
+    def testNodeAddresses(self):
+        addresses = engine_AMR.nodeAddresses(penman.decode(REENTRANT))
+        self.assertEqual(addresses["0.1.0"], "c")
+        self.assertEqual(addresses["0.1.0.0"], "n2")
+        self.assertEqual(addresses["0.1.0.0.0"], "n2")
+
+    def testMetadataAlignments(self):
+        record = "# ::id test.1\n# ::snt John met France .\n# ::alignments 0-1|0.0.0+0.0.0.0 2-3|0.1.0.0+0.1.0.0.0\n" + REENTRANT
+        chops, stats = engine_AMR.processRecord(record, ["anywhere"], alignments=True)
+        self.assertEqual([(chop[3]["node"], chop[3]["label"]) for chop in chops["anywhere"]], [("n", "John"), ("n2", "France")])
+        self.assertEqual(stats.counts["aligned"], 1)
+
+    def testSurfaceAlignments(self):
+        graph = penman.decode('(m / meet-03 :ARG1 (c / country :name (n / name :op1 "France"~e.2)))')
+        self.assertEqual(engine_AMR.readAlignments(graph), {2: {"n"}})
+
+class ReadRecordsTest(unittest.TestCase):
+    def testSeparators(self):
+        f = io.BytesIO(b"# AMR release header\r\n\r\n# ::id a\r\n(v / visit-01)\r\n\r\n\n# ::id b\n(c / country)")
+        self.assertEqual(list(engine_AMR.readRecords(f)), ["# ::id a\n(v / visit-01)", "# ::id b\n(c / country)"])
+
+    # A line of only whitespace inside a graph does not end the record.
+    def testWhitespaceLine(self):
+        f = io.BytesIO(b"# ::id a\n(v / visit-01\n   \n   :ARG1 (c / country))\n\n# ::id b\n(c / country)\n")
+        records = list(engine_AMR.readRecords(f))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(len(penman.decode(records[0]).triples), 3)
+
+if __name__ == "__main__":
+    unittest.main()